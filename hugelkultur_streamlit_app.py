@@ -5,10 +5,11 @@
 # - NEW: Visible mound "sinking" over years due to shrinkage/settling (separate height settling rate)
 # - Displays note: "Hugelbeds sink in size after several years..." [2]
 
-import math, time
+import time
 import numpy as np
 import streamlit as st
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
 import folium
 from streamlit_folium import st_folium
 
@@ -112,12 +113,11 @@ fps = st.sidebar.slider("Frames per second", 5, 30, 15)
 
 # -------------------- Hydrology Functions --------------------
 def scs_runoff_mm(P_mm, CN):
-    """Cumulative runoff depth (mm) via SCS-CN."""
+    """Cumulative runoff depth (mm) via SCS-CN; accepts a scalar or an array of depths."""
     S = (25400 / CN) - 254
     Ia = 0.2 * S
-    if P_mm <= Ia:
-        return 0.0
-    return ((P_mm - Ia) ** 2) / (P_mm - Ia + S)
+    excess = np.maximum(np.asarray(P_mm, dtype=float) - Ia, 0.0)
+    return excess ** 2 / (excess + S)
 
 def hyetograph(total_mm, minutes, shape="Steady", jitter=0.0):
     """Rain intensity series (mm/minute)."""
@@ -145,6 +145,19 @@ def mound_capacity(L, W, H, phi):
     """Triangular cross-section * length * porosity (m³)."""
     return 0.5 * W * H * L * phi
 
+def simulate_storm(rain_series, CN, A, S_effective):
+    """Per-minute cumulative rain (mm), runoff without/with mound (m³) and intercepted volume (m³)."""
+    cumP_t = np.cumsum(rain_series)
+    dQ = np.maximum(np.diff(scs_runoff_mm(cumP_t, CN), prepend=0.0), 0.0)  # incremental runoff depth (mm)
+    dV_t = (dQ / 1000.0) * A                                                # incremental runoff volume (m³)
+    no_mound_t = np.cumsum(dV_t)
+
+    # Interception by mound (from runoff only): it takes every drop until the
+    # effective storage is full, so the stored volume is the capped cumulative runoff.
+    intercepted_t = np.minimum(no_mound_t, max(S_effective, 0.0))
+    with_mound_t = no_mound_t - intercepted_t
+    return cumP_t, no_mound_t, with_mound_t, intercepted_t
+
 # -------------------- Simulation Setup --------------------
 minutes = int(duration_min)
 rain_series = hyetograph(total_rain_mm, minutes, rain_shape, randiness)
@@ -161,75 +174,80 @@ height_settle_factor = (1.0 - annual_height_settling) ** years_since_build
 H_visible = max(H * height_settle_factor, 0.05)  # keep a tiny floor to avoid zero-height drawing
 core_height_visible = H_visible * 0.7
 
-# Initialize accumulators
-cumP = 0.0
-cum_runoff_no_mound = 0.0
-cum_runoff_with_mound = 0.0
-intercepted = 0.0
+cumP_t, no_mound_t, with_mound_t, intercepted_t = simulate_storm(rain_series, CN, A, S_effective)
+
+fill_ratio_t = intercepted_t / S_effective if S_effective > 0 else np.zeros(minutes)
+water_h_t = core_height_visible * np.minimum(fill_ratio_t, 1.0)
+
+# Schematic geometry is fixed for the whole storm; only the water level and title change per frame
+cx = 5.0
+left = cx - W / 2.0
+right = cx + W / 2.0
+core_left, core_right = left + 0.2, right - 0.2
+y_top = max(2, H * 1.3)  # keep y-limits stable relative to as-built H for easy comparison
+
+# Show dashed line marking "effective capacity" level relative to visible core
+show_capacity_line = years_since_build > 0 and (annual_storage_decay > 0 or annual_height_settling > 0)
+# Translate storage decay (void loss) into a notional horizontal line inside the core
+# purely for visual cue; does not change hydrology beyond S_effective
+eff_core_h_line = core_height_visible * max(storage_decay_factor, 0.0)
+
+# ------------- Draw schematic once (with visible sinking) -------------
+# A bare Figure keeps out of pyplot's global registry, so an interrupted rerun leaks nothing
+fig = Figure(figsize=(10, 4))
+ax = fig.add_subplot()
+ax.plot([0, 10], [0, 0], color="saddlebrown", linewidth=5)  # ground line
+
+# Soil mound (visible/settled height)
+ax.fill([left, cx, right], [0, H_visible, 0], color="#cd853f", alpha=0.7, label="Soil")
+
+# Core (visible/settled height)
+ax.fill([core_left, cx, core_right], [0, core_height_visible, 0], color="#8b5a2b", alpha=0.5, label="Wood core")
+
+# Stored water (limited by effective storage, drawn within visible core); resized every frame
+water = ax.add_patch(Rectangle(
+    (core_left, 0), core_right - core_left, 0,
+    color="dodgerblue", alpha=0.6, label="Stored water", visible=False
+))
+
+if show_capacity_line:
+    ax.plot([core_left, core_right], [eff_core_h_line, eff_core_h_line], linestyle="--", color="black", linewidth=1)
+    ax.text(core_right, eff_core_h_line + 0.03, "effective capacity", ha="right", va="bottom", fontsize=8)
+
+ax.set_xlim(0, 10)
+ax.set_ylim(0, y_top)
+ax.axis("off")
+title = ax.set_title("")
 
 placeholder = st.empty()
 progress = st.progress(0)
 
 # -------------------- Simulation Loop --------------------
+frame_interval = 1.0 / fps
 for minute in range(minutes):
-    dP = rain_series[minute]
-    Q_prev = scs_runoff_mm(cumP, CN)
-    cumP += dP
-    Q_curr = scs_runoff_mm(cumP, CN)
-    dQ = max(Q_curr - Q_prev, 0.0)      # incremental runoff depth (mm)
-    dV = (dQ / 1000.0) * A              # incremental runoff volume (m³)
-    cum_runoff_no_mound += dV
-
-    # Interception by mound (from runoff only), limited by effective storage
-    if intercepted < S_effective:
-        take = min(S_effective - intercepted, dV)
-        intercepted += take
-        dV -= take
-    cum_runoff_with_mound += dV
-
-    fill_ratio = intercepted / S_effective if S_effective > 0 else 0.0
-
-    # ------------- Draw schematic (with visible sinking) -------------
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot([0, 10], [0, 0], color="saddlebrown", linewidth=5)  # ground line
-
-    cx = 5.0
-    left = cx - W / 2.0
-    right = cx + W / 2.0
-
-    # Soil mound (visible/settled height)
-    ax.fill([left, cx, right], [0, H_visible, 0], color="#cd853f", alpha=0.7, label="Soil")
-
-    # Core (visible/settled height)
-    ax.fill([left + 0.2, cx, right - 0.2], [0, core_height_visible, 0], color="#8b5a2b", alpha=0.5, label="Wood core")
-
-    # Stored water (limited by effective storage, drawn within visible core)
-    if fill_ratio > 0:
-        water_h = core_height_visible * min(fill_ratio, 1.0)
-        ax.fill_between([left + 0.2, right - 0.2], 0, water_h, color="dodgerblue", alpha=0.6, label="Stored water")
-
-    # Show dashed line marking "effective capacity" level relative to visible core
-    if years_since_build > 0 and (annual_storage_decay > 0 or annual_height_settling > 0):
-        # Translate storage decay (void loss) into a notional horizontal line inside the core
-        # purely for visual cue; does not change hydrology beyond S_effective
-        eff_ratio = max(storage_decay_factor, 0.0)
-        eff_core_h_line = core_height_visible * eff_ratio
-        ax.plot([left + 0.2, right - 0.2], [eff_core_h_line, eff_core_h_line], linestyle="--", color="black", linewidth=1)
-        ax.text(right - 0.2, eff_core_h_line + 0.03, "effective capacity", ha="right", va="bottom", fontsize=8)
-
-    ax.set_xlim(0, 10)
-    ax.set_ylim(0, max(2, H * 1.3))  # keep y-limits stable relative to as-built H for easy comparison
-    ax.axis("off")
-    ax.set_title(
+    frame_start = time.perf_counter()
+    cumP = cumP_t[minute]
+    cum_runoff_no_mound = no_mound_t[minute]
+    intercepted = intercepted_t[minute]
+
+    # Only the water level and title change between frames
+    water.set_height(water_h_t[minute])
+    water.set_visible(fill_ratio_t[minute] > 0)
+    title.set_text(
         f"Minute {minute+1}/{minutes} | Rain {cumP:.1f} mm | "
         f"Intercepted {intercepted:.2f} m³ | Runoff (no mound) {cum_runoff_no_mound:.2f} m³"
     )
 
     placeholder.pyplot(fig)
     progress.progress((minute + 1) / minutes)
-    time.sleep(1.0 / fps)
+    # Sleep only for what is left of the frame budget after rendering
+    time.sleep(max(0.0, frame_interval - (time.perf_counter() - frame_start)))
 
 # -------------------- Results --------------------
+cumP = cumP_t[-1]
+cum_runoff_no_mound = no_mound_t[-1]
+cum_runoff_with_mound = with_mound_t[-1]
+intercepted = intercepted_t[-1]
 st.success("✅ Simulation complete!")
 
 col1, col2, col3 = st.columns(3)
@@ -242,10 +260,9 @@ st.write(f"**Intercepted water volume (this storm):** {intercepted:.2f} m³")
 # Capacity & geometry panel
 st.markdown("### 🪵 Storage Capacity, Settling & Decomposition")
 cap1, cap2, cap3, cap4 = st.columns(4)
-S_initial_val = mound_capacity(L, W, H, porosity)
-cap1.metric("As-built capacity (m³)", f"{S_initial_val:.2f}")
+cap1.metric("As-built capacity (m³)", f"{S_initial:.2f}")
 cap2.metric("Effective capacity today (m³)", f"{S_effective:.2f}")
-remain_pct = 100.0 * (S_effective / S_initial_val) if S_initial_val > 0 else 0.0
+remain_pct = 100.0 * (S_effective / S_initial) if S_initial > 0 else 0.0
 cap3.metric("Capacity remaining", f"{remain_pct:.0f}%")
 cap4.metric("Visible height today (m)", f"{H_visible:.2f}")
 